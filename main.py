@@ -1,5 +1,14 @@
+import logging
+import os
+import sys
+
 from src.etl.etl import run_etl
 
 
 if __name__ == "__main__":
-    run_etl()
\ No newline at end of file
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(message)s",
+        stream=sys.stdout
+    )
+    run_etl()
@@ -1,9 +1,22 @@
 import platform
 import subprocess
 import json
+import logging
+import socket
+import http.client
+from urllib.parse import quote
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+logger = logging.getLogger(__name__)
+
 # Load environment variables
 load_dotenv()
 
@@ -11,10 +24,14 @@ MONGO_USERNAME = os.getenv("MONGO_USERNAME")
 MONGO_PASSWORD = os.getenv("MONGO_PASSWORD")
 MONGO_PORT = os.getenv("MONGO_PORT")
 
+DOCKER_SOCKET = "/var/run/docker.sock"
+
+@lru_cache(maxsize=1)
 def is_windows():
     return platform.system().lower() == 'windows'
 
 
+@lru_cache(maxsize=1)
 def is_wsl():
     try:
         with open('/proc/version', 'r') as f:
@@ -23,6 +40,7 @@ def is_wsl():
         return False
 
 
+@lru_cache(maxsize=1)
 def is_running_in_docker():
     """
     Check if we're running inside a Docker container.
@@ -30,23 +48,25 @@ def is_running_in_docker():
     This is critical for determining the correct MongoDB host:
     - Inside Docker: use 'mongo' (service name from docker-compose)
     - Outside Docker (local dev): use 'localhost'
+
+    The result is cached - the environment cannot change within a process.
     """
     # Method 1: Check /proc/1/cgroup (most reliable - checks PID 1)
     try:
         with open("/proc/1/cgroup", "rt") as f:
             content = f.read()
             if "docker" in content or "kubepods" in content:
-                print("DEBUG: Found docker/kubepods in /proc/1/cgroup - running in Docker")
+                logger.debug("Found docker/kubepods in /proc/1/cgroup - running in Docker")
                 return True
     except FileNotFoundError:
         # Not Linux or /proc not available
         pass
     except Exception as e:
-        print(f"DEBUG: Could not read /proc/1/cgroup: {e}")
+        logger.debug("Could not read /proc/1/cgroup: %s", e)
 
     # Method 2: Check for .dockerenv file
     if os.path.exists('/.dockerenv'):
-        print("DEBUG: Found /.dockerenv file - running in Docker")
+        logger.debug("Found /.dockerenv file - running in Docker")
         return True
 
     # Method 3: Check current process cgroup
@@ -54,32 +74,78 @@ def is_running_in_docker():
         with open('/proc/self/cgroup', 'r') as f:
             content = f.read()
             if 'docker' in content or 'containerd' in content:
-                print("DEBUG: Found docker/containerd in /proc/self/cgroup - running in Docker")
+                logger.debug("Found docker/containerd in /proc/self/cgroup - running in Docker")
                 return True
     except:
         pass
 
     # Method 4: Check environment variable (set by docker-compose)
     if os.getenv('IN_DOCKER') or os.getenv('DOCKER_CONTAINER'):
-        print("DEBUG: Found IN_DOCKER env var - running in Docker")
+        logger.debug("Found IN_DOCKER env var - running in Docker")
         return True
 
     # Method 5: Check if hostname matches container ID pattern
     try:
         hostname = os.uname().nodename
         if len(hostname) == 12 and all(c in '0123456789abcdef' for c in hostname):
-            print(f"DEBUG: Hostname '{hostname}' looks like container ID - running in Docker")
+            logger.debug("Hostname '%s' looks like container ID - running in Docker", hostname)
             return True
     except:
         pass
 
-    print("DEBUG: Not detected as running in Docker - assuming local development")
+    logger.debug("Not detected as running in Docker - assuming local development")
     return False
 
 
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over the Docker daemon Unix socket"""
+
+    def __init__(self, socket_path, timeout=5):
+        super().__init__("docker", timeout=timeout)
+        self._socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
+
+
+def _docker_get(path):
+    """
+    GET a Docker Engine API path over the Unix socket.
+    Returns parsed JSON, or None if the socket is unavailable or the request fails.
+    """
+    if not os.path.exists(DOCKER_SOCKET):
+        return None
+
+    conn = _UnixHTTPConnection(DOCKER_SOCKET)
+    try:
+        conn.request("GET", path)
+        response = conn.getresponse()
+        body = response.read()
+        if response.status != 200:
+            return None
+        return _json_loads(body)
+    except Exception as e:
+        logger.warning("Docker API request failed (%s): %s", path, e)
+        return None
+    finally:
+        conn.close()
+
+
 def get_docker_container_ip(container_name):
+    # Method 1: Docker Engine API over the Unix socket (no subprocess)
+    info = _docker_get(f"/containers/{quote(container_name)}/json")
+    if info:
+        networks = (info.get('NetworkSettings') or {}).get('Networks') or {}
+        ip = ''.join(net.get('IPAddress', '') for net in networks.values())
+        if ip:
+            logger.info("✓ Found container '%s' at IP: %s", container_name, ip)
+            return ip
+        return None
+
     try:
-        # Method 1: Using docker inspect
+        # Method 2: Using docker inspect
         result = subprocess.run(
             ['docker', 'inspect', '-f', '{{range .NetworkSettings.Networks}}{{.IPAddress}}{{end}}', container_name],
             capture_output=True,
@@ -89,15 +155,15 @@ def get_docker_container_ip(container_name):
         
         if result.returncode == 0 and result.stdout.strip():
             ip = result.stdout.strip()
-            print(f"✓ Found container '{container_name}' at IP: {ip}")
+            logger.info("✓ Found container '%s' at IP: %s", container_name, ip)
             return ip
             
     except subprocess.TimeoutExpired:
-        print(f"Docker command timed out")
+        logger.warning("Docker command timed out")
     except FileNotFoundError:
-        print(f"Docker command not found. Is Docker installed?")
+        logger.warning("Docker command not found. Is Docker installed?")
     except Exception as e:
-        print(f"Error getting container IP: {e}")
+        logger.error("Error getting container IP: %s", e)
     
     return None
 
@@ -110,79 +176,102 @@ def get_mongo_host():
     1. MONGO_HOST environment variable (if explicitly set)
     2. Auto-detection based on environment
     """
-    print(f"DEBUG: Environment detection starting...")
-
-    # Check if MONGO_HOST is explicitly set in environment
+    # Check if MONGO_HOST is explicitly set in environment - skips all detection
     explicit_host = os.getenv('MONGO_HOST')
     if explicit_host:
-        print(f"✓ Using explicit MONGO_HOST from environment: {explicit_host}")
+        logger.info("✓ Using explicit MONGO_HOST from environment: %s", explicit_host)
         return explicit_host
 
+    logger.debug("Environment detection starting...")
+
     # Auto-detect environment
     if is_running_in_docker():
         host = 'mongo'  # Default service name in docker-compose
-        print(f"✓ Detected Docker container environment")
-        print(f"  → Using MongoDB host: {host} (docker-compose service name)")
+        logger.info("✓ Detected Docker container environment")
+        logger.info("  → Using MongoDB host: %s (docker-compose service name)", host)
         return host
 
     # Running locally (VSCode, terminal, etc.)
     if is_windows():
-        print(f"✓ Detected Windows host environment")
-        print(f"  → Using MongoDB host: localhost (local development)")
+        logger.info("✓ Detected Windows host environment")
+        logger.info("  → Using MongoDB host: localhost (local development)")
         return "localhost"
 
     if is_wsl():
-        print(f"✓ Detected WSL environment")
-        print(f"  → Using MongoDB host: localhost (local development)")
+        logger.info("✓ Detected WSL environment")
+        logger.info("  → Using MongoDB host: localhost (local development)")
         return "localhost"
 
     # Linux host - try to find MongoDB container
     container_name = os.getenv("MONGO_CONTAINER_NAME")
     if container_name:
-        print(f"✓ Detected Linux host - attempting to find MongoDB container: {container_name}")
+        logger.info("✓ Detected Linux host - attempting to find MongoDB container: %s", container_name)
         container_ip = get_docker_container_ip(container_name)
         if container_ip:
-            print(f"  → Using MongoDB container IP: {container_ip}")
-            print(f"  Note: If connection fails, set MONGO_HOST=localhost in .env")
+            logger.info("  → Using MongoDB container IP: %s", container_ip)
+            logger.info("  Note: If connection fails, set MONGO_HOST=localhost in .env")
             return container_ip
 
     # Final fallback
-    print(f"✓ Using default MongoDB host: localhost (local development)")
+    logger.info("✓ Using default MongoDB host: localhost (local development)")
     return "localhost"
 
 
+def _list_running_containers():
+    """
+    List running containers as dicts with name, id, image and ports.
+    Uses the Docker Engine API when the socket is available, otherwise `docker ps`.
+    """
+    api_containers = _docker_get("/containers/json")
+    if api_containers is not None:
+        return [
+            {
+                'name': ','.join(n.lstrip('/') for n in c.get('Names') or []),
+                'id': c.get('Id', ''),
+                'image': c.get('Image', ''),
+                'ports': c.get('Ports')
+            }
+            for c in api_containers
+        ]
+
+    result = subprocess.run(
+        ['docker', 'ps', '--format', '{{json .}}'],
+        capture_output=True,
+        timeout=5
+    )
+    
+    if result.returncode != 0:
+        return []
+
+    containers = []
+    for line in result.stdout.splitlines():
+        if line:
+            container = _json_loads(line.decode('utf-8'))
+            containers.append({
+                'name': container.get('Names', ''),
+                'id': container.get('ID', ''),
+                'image': container.get('Image', ''),
+                'ports': container.get('Ports')
+            })
+    return containers
+
+
 def list_mongo_containers():
     try:
-        # Get all running containers
-        result = subprocess.run(
-            ['docker', 'ps', '--format', '{{json .}}'],
-            capture_output=True,
-            text=True,
-            timeout=5
-        )
+        # Get all running containers and keep the MongoDB ones
+        containers = [
+            c for c in _list_running_containers()
+            if 'mongo' in c['image'].lower() or 'mongo' in c['name'].lower()
+        ]
         
-        if result.returncode == 0:
-            containers = []
-            for line in result.stdout.strip().split('\n'):
-                if line:
-                    container = json.loads(line)
-                    # Check if it's a MongoDB container
-                    if 'mongo' in container.get('Image', '').lower() or 'mongo' in container.get('Names', '').lower():
-                        containers.append({
-                            'name': container.get('Names'),
-                            'id': container.get('ID'),
-                            'image': container.get('Image'),
-                            'ports': container.get('Ports')
-                        })
-            
-            if containers:
-                print(f"Found {len(containers)} MongoDB container(s):")
-                for c in containers:
-                    print(f"   - {c['name']} (ID: {c['id'][:12]}, Image: {c['image']})")
-            
-            return containers
+        if containers:
+            logger.info("Found %d MongoDB container(s):", len(containers))
+            for c in containers:
+                logger.info("   - %s (ID: %s, Image: %s)", c['name'], c['id'][:12], c['image'])
+        
+        return containers
     except Exception as e:
-        print(f"Error listing containers: {e}")
+        logger.error("Error listing containers: %s", e)
     
     return []
 
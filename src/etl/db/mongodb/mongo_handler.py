@@ -1,10 +1,15 @@
 import os
+import logging
+import threading
+import time
 from datetime import datetime
 from dotenv import load_dotenv
-from pymongo import MongoClient, ASCENDING
+from pymongo import MongoClient, ASCENDING, IndexModel
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 from src.etl.db.mongodb.mongo_finder import get_mongo_host, build_mongo_uri, list_mongo_containers
 
+logger = logging.getLogger(__name__)
+
 # Only load .env if environment variables aren't already set (docker-compose takes precedence)
 if not os.getenv('MONGO_HOST'):
     load_dotenv()
@@ -16,29 +21,25 @@ MONGO_CONTAINER_NAME = os.getenv("MONGO_CONTAINER_NAME")
 MONGO_USERNAME = os.getenv("MONGO_USERNAME")
 MONGO_PASSWORD = os.getenv("MONGO_PASSWORD")
 
-# Students database configuration
-STUDENTS_DB = os.getenv("STUDENTS_DB")
-STUDENTS_STATS = os.getenv("STUDENTS_STATS")
+# MongoClient tuning
+MONGO_POOL_SIZE = int(os.getenv("MONGO_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+MONGO_MAX_IDLE_MS = int(os.getenv("MONGO_MAX_IDLE_MS", "60000"))
+MONGO_WRITE_CONCERN = os.getenv("MONGO_WRITE_CONCERN", "1")
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "zstd,zlib")
 
-# Sales database configuration
-SALES_DB = os.getenv("SALES_DB")
-SALES_LAST_RUN_COLLECTION = os.getenv("SALES_LAST_RUN_COLLECTION")
+# Validate required environment variables (_env is an alias of the live os.environ, not a copy)
+_env = os.environ
+REQUIRED_VARS = (
+    "STUDENTS_DB",
+    "STUDENTS_STATS",
+    "SALES_DB",
+    "SALES_LAST_RUN_COLLECTION",
+    "LOGGER_DB",
+    "LOGGER_STATS",
+)
 
-# Logger database configuration
-LOGGER_DB = os.getenv("LOGGER_DB")
-LOGGER_STATS = os.getenv("LOGGER_STATS")
-
-# Validate required environment variables
-required_vars = {
-    "STUDENTS_DB": STUDENTS_DB,
-    "STUDENTS_STATS": STUDENTS_STATS,
-    "SALES_DB": SALES_DB,
-    "SALES_LAST_RUN_COLLECTION": SALES_LAST_RUN_COLLECTION,
-    "LOGGER_DB": LOGGER_DB,
-    "LOGGER_STATS": LOGGER_STATS
-}
-
-missing_vars = [var for var, value in required_vars.items() if not value]
+missing_vars = [var for var in REQUIRED_VARS if not _env.get(var)]
 if missing_vars:
     error_msg = f"""
 {'='*60}
@@ -60,26 +61,46 @@ Current .env location: {os.path.abspath('.env')}
 """
     raise ValueError(error_msg)
 
+# Students database configuration
+STUDENTS_DB = _env["STUDENTS_DB"]
+STUDENTS_STATS = _env["STUDENTS_STATS"]
+
+# Sales database configuration
+SALES_DB = _env["SALES_DB"]
+SALES_LAST_RUN_COLLECTION = _env["SALES_LAST_RUN_COLLECTION"]
+
+# Logger database configuration
+LOGGER_DB = _env["LOGGER_DB"]
+LOGGER_STATS = _env["LOGGER_STATS"]
+
+# How long a test_connection() ping result is reused
+PING_CACHE_SECONDS = 1.0
+
+# (database, collection) pairs whose indexes were already ensured in this process
+_ENSURED_INDEXES = set()
+
+
 class MongoDBConnection:
-    """Handler for MongoDB connection and setup"""
+    """
+    Handler for MongoDB connection and setup.
+    Use get_mongo_connection() to share a single instance per process.
+    """
     
-    _instance = None
     _client = None
     _students_db = None
     _sales_db = None
     _logger_db = None
+    _students_stats = None
+    _sales_last_run = None
+    _logger_stats = None
+    _db_map = None
     _host = None
-    
-    def __new__(cls):
-        """Singleton pattern to ensure single connection"""
-        if cls._instance is None:
-            cls._instance = super(MongoDBConnection, cls).__new__(cls)
-        return cls._instance
+    _last_ping_ts = 0.0
+    _last_ping_ok = False
     
     def __init__(self):
-        """Initialize MongoDB connection if not already connected"""
-        if self._client is None:
-            self._connect()
+        """Initialize MongoDB connection"""
+        self._connect()
     
     @staticmethod
     def get_current_timestamp():
@@ -130,43 +151,62 @@ class MongoDBConnection:
         mongo_uri = build_mongo_uri(self._host)
         
         try:
-            print(f"Attempting to connect to MongoDB...")
-            print(f"   Host: {self._host}:{MONGO_PORT}")
-            print(f"   Students Database: {STUDENTS_DB}")
-            print(f"   Sales Database: {SALES_DB}")
-            print(f"   Logger Database: {LOGGER_DB}")
+            logger.info("Attempting to connect to MongoDB...")
+            logger.info("   Host: %s:%s", self._host, MONGO_PORT)
+            logger.info("   Students Database: %s", STUDENTS_DB)
+            logger.info("   Sales Database: %s", SALES_DB)
+            logger.info("   Logger Database: %s", LOGGER_DB)
+            
+            # Create client with timeout, pool, write concern and compression settings
+            client_options = {
+                "serverSelectionTimeoutMS": 5000,  # 5 second timeout
+                "connectTimeoutMS": 5000,
+                "socketTimeoutMS": 20000,  # room for bulk writes
+                "maxPoolSize": MONGO_POOL_SIZE,
+                "minPoolSize": MONGO_MIN_POOL_SIZE,  # keep warm sockets between batches
+                "maxIdleTimeMS": MONGO_MAX_IDLE_MS,
+                "retryWrites": True,
+                "w": int(MONGO_WRITE_CONCERN) if MONGO_WRITE_CONCERN.isdigit() else MONGO_WRITE_CONCERN,
+            }
+            if MONGO_COMPRESSORS:
+                client_options["compressors"] = MONGO_COMPRESSORS
+                client_options["zlibCompressionLevel"] = 6
             
-            # Create client with timeout settings
-            self._client = MongoClient(
-                mongo_uri,
-                serverSelectionTimeoutMS=5000,  # 5 second timeout
-                connectTimeoutMS=5000,
-                socketTimeoutMS=5000
-            )
+            self._client = MongoClient(mongo_uri, **client_options)
             
             # Test connection
             self._client.admin.command('ping')
-            print(f"✓ Successfully connected to MongoDB!")
+            logger.info("✓ Successfully connected to MongoDB!")
             
             # Setup all databases
             self._students_db = self._client[STUDENTS_DB]
             self._sales_db = self._client[SALES_DB]
             self._logger_db = self._client[LOGGER_DB]
-            print(f"✓ Using databases: {STUDENTS_DB}, {SALES_DB}, {LOGGER_DB}")
+            logger.info("✓ Using databases: %s, %s, %s", STUDENTS_DB, SALES_DB, LOGGER_DB)
+            
+            # Bind collection handles once so accessors are a plain attribute read
+            self._students_stats = self._students_db[STUDENTS_STATS]
+            self._sales_last_run = self._sales_db[SALES_LAST_RUN_COLLECTION]
+            self._logger_stats = self._logger_db[LOGGER_STATS]
+            self._db_map = {
+                "students": self._students_db,
+                "sales": self._sales_db,
+                "logger": self._logger_db,
+            }
             
             # Setup collections and indexes
             self._setup_collections()
             
         except ServerSelectionTimeoutError:
-            print(f"Could not connect to MongoDB at {self._host}:{MONGO_PORT}")
-            print(f"Trying to find MongoDB containers...")
+            logger.error("Could not connect to MongoDB at %s:%s", self._host, MONGO_PORT)
+            logger.info("Trying to find MongoDB containers...")
             list_mongo_containers()
             raise
         except ConnectionFailure as e:
-            print(f"Failed to connect to MongoDB: {e}")
+            logger.error("Failed to connect to MongoDB: %s", e)
             raise
         except Exception as e:
-            print(f"Error during MongoDB setup: {e}")
+            logger.error("Error during MongoDB setup: %s", e)
             raise
     
     def _setup_collections(self):
@@ -176,14 +216,22 @@ class MongoDBConnection:
         - students_db.student_stats
         - sales_db.last_run_timestamp
         - logger_db.logger_stats
+        Collections whose indexes are already in _ENSURED_INDEXES are skipped,
+        so a failed index setup is retried on the next connect.
         """
+        # Get collection references (exact names from .env)
+        students_stats_collection = self._students_stats
+        sales_last_run_collection = self._sales_last_run
+        logger_stats_collection = self._logger_stats
+        
+        if all(
+            (collection.database.name, collection.name) in _ENSURED_INDEXES
+            for collection in (students_stats_collection, sales_last_run_collection, logger_stats_collection)
+        ):
+            return
+        
         try:
-            print(f"Setting up collections...")
-            
-            # Get collection references (exact names from .env)
-            students_stats_collection = self._students_db[STUDENTS_STATS]
-            sales_last_run_collection = self._sales_db[SALES_LAST_RUN_COLLECTION]
-            logger_stats_collection = self._logger_db[LOGGER_STATS]
+            logger.info("Setting up collections...")
             
             # Create indexes for student_stats collection
             self._create_student_stats_indexes(students_stats_collection, STUDENTS_STATS)
@@ -194,10 +242,10 @@ class MongoDBConnection:
             # Create indexes for logger_stats collection
             self._create_logger_stats_indexes(logger_stats_collection, LOGGER_STATS)
             
-            print(f"✓ Collections and indexes setup complete")
+            logger.info("✓ Collections and indexes setup complete")
             
         except Exception as e:
-            print(f"Warning: Could not setup collections: {e}")
+            logger.warning("Could not setup collections: %s", e)
     
     def _create_student_stats_indexes(self, collection, collection_name):
         """
@@ -212,75 +260,96 @@ class MongoDBConnection:
         - paid: bool (payment status for this class)
         - message_count: int (messages sent for this class)
         """
+        index_key = (collection.database.name, collection.name)
+        if index_key in _ENSURED_INDEXES:
+            return
+
         try:
-            # Index on phone_number for fast lookups
-            collection.create_index([("phone_number", ASCENDING)], name="phone_number_idx")
+            collection.create_indexes([
+                # Index on phone_number for fast lookups
+                IndexModel([("phone_number", ASCENDING)], name="phone_number_idx"),
 
-            # Index on uniq_id (unique identifier)
-            collection.create_index([("uniq_id", ASCENDING)], unique=True, name="uniq_id_idx")
+                # Index on uniq_id (unique identifier)
+                IndexModel([("uniq_id", ASCENDING)], unique=True, name="uniq_id_idx"),
 
-            # Index on current_lesson for filtering
-            collection.create_index([("current_lesson", ASCENDING)], name="current_lesson_idx")
+                # Index on current_lesson for filtering
+                IndexModel([("current_lesson", ASCENDING)], name="current_lesson_idx"),
 
-            # Index on updated_at for sorting (now a string)
-            collection.create_index([("updated_at", ASCENDING)], name="updated_at_idx")
+                # Index on updated_at for sorting (now a string)
+                IndexModel([("updated_at", ASCENDING)], name="updated_at_idx"),
 
-            # Index on created_at for sorting (now a string)
-            collection.create_index([("created_at", ASCENDING)], name="created_at_idx")
+                # Index on created_at for sorting (now a string)
+                IndexModel([("created_at", ASCENDING)], name="created_at_idx"),
 
-            # Index on name for searching
-            collection.create_index([("name", ASCENDING)], name="name_idx")
+                # Index on name for searching
+                IndexModel([("name", ASCENDING)], name="name_idx"),
 
-            # Index on lessons.paid for payment status queries
-            collection.create_index([("lessons.paid", ASCENDING)], name="lessons_paid_idx")
+                # Index on lessons.paid for payment status queries
+                IndexModel([("lessons.paid", ASCENDING)], name="lessons_paid_idx"),
+            ])
 
-            print(f"   ✓ Created indexes for {collection_name} (student statistics)")
+            _ENSURED_INDEXES.add(index_key)
+            logger.info("   ✓ Created indexes for %s (student statistics)", collection_name)
 
         except Exception as e:
-            print(f"   ⚠ Could not create indexes for {collection_name}: {e}")
+            logger.warning("   ⚠ Could not create indexes for %s: %s", collection_name, e)
     
     def _create_last_run_indexes(self, collection, collection_name):
         """Create indexes for last_run_timestamp collection"""
+        index_key = (collection.database.name, collection.name)
+        if index_key in _ENSURED_INDEXES:
+            return
+
         try:
-            # Index on identifier (job name or process name)
-            collection.create_index([("identifier", ASCENDING)], name="identifier_idx", unique=True)
-            
-            # Index on last_run_timestamp
-            collection.create_index([("last_run_timestamp", ASCENDING)], name="last_run_timestamp_idx")
+            collection.create_indexes([
+                # Index on identifier (job name or process name)
+                IndexModel([("identifier", ASCENDING)], name="identifier_idx", unique=True),
+                
+                # Index on last_run_timestamp
+                IndexModel([("last_run_timestamp", ASCENDING)], name="last_run_timestamp_idx"),
+            ])
             
-            print(f"   ✓ Created indexes for {collection_name} (tracking)")
+            _ENSURED_INDEXES.add(index_key)
+            logger.info("   ✓ Created indexes for %s (tracking)", collection_name)
             
         except Exception as e:
-            print(f"   ⚠ Could not create indexes for {collection_name}: {e}")
+            logger.warning("   ⚠ Could not create indexes for %s: %s", collection_name, e)
     
     def _create_logger_stats_indexes(self, collection, collection_name):
         """Create indexes for logger_stats collection"""
+        index_key = (collection.database.name, collection.name)
+        if index_key in _ENSURED_INDEXES:
+            return
+
         try:
-            # Index on timestamp for chronological queries
-            collection.create_index([("timestamp", ASCENDING)], name="timestamp_idx")
-            
-            # Index on log_level for filtering (info, warning, error, etc.)
-            collection.create_index([("log_level", ASCENDING)], name="log_level_idx")
-            
-            # Index on source/module for filtering by origin
-            collection.create_index([("source", ASCENDING)], name="source_idx")
+            collection.create_indexes([
+                # Index on timestamp for chronological queries
+                IndexModel([("timestamp", ASCENDING)], name="timestamp_idx"),
+                
+                # Index on log_level for filtering (info, warning, error, etc.)
+                IndexModel([("log_level", ASCENDING)], name="log_level_idx"),
+                
+                # Index on source/module for filtering by origin
+                IndexModel([("source", ASCENDING)], name="source_idx"),
+                
+                # Compound index for time-based queries by level
+                IndexModel([
+                    ("log_level", ASCENDING),
+                    ("timestamp", ASCENDING)
+                ], name="level_timestamp_idx"),
+                
+                # Compound index for source + timestamp queries
+                IndexModel([
+                    ("source", ASCENDING),
+                    ("timestamp", ASCENDING)
+                ], name="source_timestamp_idx"),
+            ])
             
-            # Compound index for time-based queries by level
-            collection.create_index([
-                ("log_level", ASCENDING),
-                ("timestamp", ASCENDING)
-            ], name="level_timestamp_idx")
-            
-            # Compound index for source + timestamp queries
-            collection.create_index([
-                ("source", ASCENDING),
-                ("timestamp", ASCENDING)
-            ], name="source_timestamp_idx")
-            
-            print(f"   ✓ Created indexes for {collection_name} (logger statistics)")
+            _ENSURED_INDEXES.add(index_key)
+            logger.info("   ✓ Created indexes for %s (logger statistics)", collection_name)
             
         except Exception as e:
-            print(f"   ⚠ Could not create indexes for {collection_name}: {e}")
+            logger.warning("   ⚠ Could not create indexes for %s: %s", collection_name, e)
     
     def get_students_database(self):
         """Get Students MongoDB database instance"""
@@ -302,26 +371,30 @@ class MongoDBConnection:
     
     def get_collection(self, database_name, collection_name):
         """Get a specific collection from a database"""
-        if database_name == "students":
-            return self.get_students_database()[collection_name]
-        elif database_name == "sales":
-            return self.get_sales_database()[collection_name]
-        elif database_name == "logger":
-            return self.get_logger_database()[collection_name]
-        else:
+        if self._db_map is None:
+            self._connect()
+        db = self._db_map.get(database_name)
+        if db is None:
             raise ValueError(f"Unknown database: {database_name}")
+        return db[collection_name]
     
     def get_students_stats_collection(self):
         """Get student_stats collection from students_db"""
-        return self.get_students_database()[STUDENTS_STATS]
+        if self._students_stats is None:
+            self._connect()
+        return self._students_stats
     
     def get_sales_last_run_collection(self):
         """Get last_run_timestamp collection from sales_db"""
-        return self.get_sales_database()[SALES_LAST_RUN_COLLECTION]
+        if self._sales_last_run is None:
+            self._connect()
+        return self._sales_last_run
     
     def get_logger_stats_collection(self):
         """Get logger_stats collection from logger_db"""
-        return self.get_logger_database()[LOGGER_STATS]
+        if self._logger_stats is None:
+            self._connect()
+        return self._logger_stats
     
     def insert_with_timestamps(self, collection, document):
         """
@@ -344,14 +417,17 @@ class MongoDBConnection:
             upsert: Whether to insert if not found
         Returns: Update result
         """
+        # One timestamp so updated_at and created_at always agree
+        current_time = self.get_current_timestamp()
+        
         # Add updated_at to the update data
-        update_data['updated_at'] = self.get_current_timestamp()
+        update_data['updated_at'] = current_time
         
         # If upserting, also add created_at
         if upsert:
             update_operation = {
                 "$set": update_data,
-                "$setOnInsert": {"created_at": self.get_current_timestamp()}
+                "$setOnInsert": {"created_at": current_time}
             }
         else:
             update_operation = {"$set": update_data}
@@ -359,12 +435,23 @@ class MongoDBConnection:
         return collection.update_one(filter_query, update_operation, upsert=upsert)
     
     def test_connection(self):
-        """Test if connection is alive"""
+        """
+        Test if connection is alive.
+        The ping result is reused for PING_CACHE_SECONDS; real operations still surface failures.
+        """
+        now = time.monotonic()
+        if now - self._last_ping_ts < PING_CACHE_SECONDS:
+            return self._last_ping_ok
+        
         try:
             self._client.admin.command('ping')
-            return True
+            ok = True
         except Exception:
-            return False
+            ok = False
+        
+        self._last_ping_ts = now
+        self._last_ping_ok = ok
+        return ok
     
     def get_connection_info(self):
         """Get connection information"""
@@ -381,25 +468,28 @@ class MongoDBConnection:
         }
     
     def list_collections(self):
-        """List all collections in all databases"""
+        """
+        List all collections in all databases.
+        Document counts come from collection metadata and are approximate.
+        """
         try:
-            print(f"\n📚 Collections in {STUDENTS_DB}:")
+            logger.info("📚 Collections in %s:", STUDENTS_DB)
             students_collections = self._students_db.list_collection_names()
             for col in students_collections:
-                count = self._students_db[col].count_documents({})
-                print(f"   - {col}: {count} documents")
+                count = self._students_db[col].estimated_document_count()
+                logger.info("   - %s: %d documents", col, count)
             
-            print(f"\n💼 Collections in {SALES_DB}:")
+            logger.info("💼 Collections in %s:", SALES_DB)
             sales_collections = self._sales_db.list_collection_names()
             for col in sales_collections:
-                count = self._sales_db[col].count_documents({})
-                print(f"   - {col}: {count} documents")
+                count = self._sales_db[col].estimated_document_count()
+                logger.info("   - %s: %d documents", col, count)
             
-            print(f"\n📝 Collections in {LOGGER_DB}:")
+            logger.info("📝 Collections in %s:", LOGGER_DB)
             logger_collections = self._logger_db.list_collection_names()
             for col in logger_collections:
-                count = self._logger_db[col].count_documents({})
-                print(f"   - {col}: {count} documents")
+                count = self._logger_db[col].estimated_document_count()
+                logger.info("   - %s: %d documents", col, count)
             
             return {
                 "students_db": students_collections,
@@ -407,7 +497,7 @@ class MongoDBConnection:
                 "logger_db": logger_collections
             }
         except Exception as e:
-            print(f"Error listing collections: {e}")
+            logger.error("Error listing collections: %s", e)
             return {}
     
     def close(self):
@@ -418,7 +508,11 @@ class MongoDBConnection:
             self._students_db = None
             self._sales_db = None
             self._logger_db = None
-            print("Closed MongoDB connection")
+            self._students_stats = None
+            self._sales_last_run = None
+            self._logger_stats = None
+            self._db_map = None
+            logger.info("Closed MongoDB connection")
     
     def __enter__(self):
         """Context manager entry"""
@@ -429,6 +523,16 @@ class MongoDBConnection:
         self.close()
 
 
+# Shared connection, created lazily by get_mongo_connection()
+_connection = None
+_connection_lock = threading.Lock()
+
+
 def get_mongo_connection():
-    """Get MongoDB connection instance"""
-    return MongoDBConnection()
\ No newline at end of file
+    """Get the shared MongoDB connection instance (safe to call from worker threads)"""
+    global _connection
+    if _connection is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = MongoDBConnection()
+    return _connection
@@ -1,21 +1,36 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
 from src.etl.extract import run_multi_group_reader
 from src.etl.sales_etl.sales_etl import run_sales_etl
 from src.etl.students_etl.students_etl import run_students_etl
+from src.sheets_connect import clear_sheet_values
+
+logger = logging.getLogger(__name__)
 
 def run_etl():
+    # Sheet snapshots live for one run only - never reuse a previous run's rows
+    clear_sheet_values()
+    
     # Extract both groups
     extract_result = run_multi_group_reader()
     students_messages = extract_result["students"]
     sales_messages = extract_result["sales"]
     
-    if len(students_messages) == 0:
-        print("=" * 60 + "\n" + "failed to read students messages" + "\n" + "=" * 60)
-        return
-    else:
-        run_students_etl(students_messages)
+    # Students and sales write to separate databases - load them side by side.
+    # An empty extract for one group does not stop the other.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = []
+
+        if len(students_messages) > 0:
+            futures.append(executor.submit(run_students_etl, students_messages))
+        else:
+            logger.warning("=" * 60 + "\n" + "failed to read students messages" + "\n" + "=" * 60)
+
+        if len(sales_messages) > 0:
+            futures.append(executor.submit(run_sales_etl, sales_messages))
+        else:
+            logger.warning("=" * 60 + "\n" + "failed to read sales messages" + "\n" + "=" * 60)
 
-    if len(sales_messages) == 0:
-        print("=" * 60 + "\n" + "failed to read sales messages" + "\n" + "=" * 60 )
-        return
-    else:
-        run_sales_etl(sales_messages)
+        for future in futures:
+            future.result()
@@ -7,14 +7,55 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import TimeoutException
 from dotenv import load_dotenv
-import time
 import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+STUDENTS_GROUP = os.getenv("STUDENTS_GROUP")
+SALES_TEAM_GROUP = os.getenv("SALES_TEAM_GROUP")
+MESSAGE_COUNT = int(os.getenv("MESSAGE_COUNT", "50"))
+
+# WhatsApp Web selectors
+SEARCH_BOX_SELECTOR = '#side [role="textbox"][contenteditable="true"]'
+MESSAGE_SELECTOR = '[data-pre-plain-text]'
+CONVERSATION_PANEL_SELECTOR = "div[data-testid='conversation-panel-body']"
+
+# Prebuilt locators for find_element(s) / expected_conditions
+SEARCH_BOX_LOCATOR = (By.CSS_SELECTOR, SEARCH_BOX_SELECTOR)
+CONVERSATION_PANEL_LOCATOR = (By.CSS_SELECTOR, CONVERSATION_PANEL_SELECTOR)
+
+# Message loading: minimum rendered messages before reading, seconds to wait per scroll attempt
+MIN_LOADED_MESSAGES = 5
+MESSAGE_LOAD_TIMEOUT = 3
+
+COUNT_MESSAGES_JS = "return document.querySelectorAll(arguments[0]).length;"
+
+# Returns [{meta, text}] for the last N messages (WhatsApp Web 2025+ text selector)
+READ_MESSAGES_JS = """
+const nodes = Array.from(document.querySelectorAll(arguments[1])).slice(-arguments[0]);
+return nodes.map(el => ({
+    meta: el.getAttribute('data-pre-plain-text'),
+    text: Array.from(el.querySelectorAll('span[dir="ltr"], span[dir="rtl"]'))
+        .map(span => span.innerText)
+        .join(' ')
+}));
+"""
 
 
 def open_whatsapp_browser():
     """Open WhatsApp Web one time and return driver + wait"""
     chrome_options = Options()
     chrome_options.add_argument("--disable-notifications")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-background-networking")
+    # Text extraction only - skip image downloads/decoding (the QR code is a canvas)
+    chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    # Return from driver.get once the DOM is interactive; readiness is checked via WebDriverWait
+    chrome_options.page_load_strategy = "eager"
 
     # Persistent session
     user_data_dir = os.path.join(os.getcwd(), "whatsapp_session")
@@ -23,36 +64,34 @@ def open_whatsapp_browser():
     driver = webdriver.Chrome(options=chrome_options)
     wait = WebDriverWait(driver, 30)
 
-    print("Opening WhatsApp Web…")
+    logger.info("Opening WhatsApp Web…")
     driver.get("https://web.whatsapp.com")
 
     # Check login
     try:
         wait.until(
-            EC.presence_of_element_located(
-                (By.CSS_SELECTOR, '#side [role="textbox"][contenteditable="true"]')
-            )
+            EC.presence_of_element_located(SEARCH_BOX_LOCATOR)
         )
-        print("Already logged in! Session restored.")
-        time.sleep(2)
+        logger.info("Already logged in! Session restored.")
     except TimeoutException:
-        print("Scan the QR code to login...")
-        time.sleep(15)
+        logger.warning("Scan the QR code to login...")
+        # Block until the chat list appears instead of sleeping a fixed time
+        WebDriverWait(driver, 120).until(
+            EC.presence_of_element_located(SEARCH_BOX_LOCATOR)
+        )
 
-    print("WhatsApp Web is ready.")
+    logger.info("WhatsApp Web is ready.")
     return driver, wait
 
 
 
 def open_group(driver, wait, group_name):
     """Open a WhatsApp group by name"""
-    print(f"--- Opening group: {group_name} ---")
+    logger.info("--- Opening group: %s ---", group_name)
 
     # Focus search box
     search_box = wait.until(
-        EC.element_to_be_clickable(
-            (By.CSS_SELECTOR, '#side [role="textbox"][contenteditable="true"]')
-        )
+        EC.element_to_be_clickable(SEARCH_BOX_LOCATOR)
     )
     search_box.click()
     search_box.send_keys(Keys.CONTROL, 'a')
@@ -92,86 +131,83 @@ def open_group(driver, wait, group_name):
     else:
         ActionChains(driver).send_keys(Keys.ARROW_DOWN).send_keys(Keys.ENTER).perform()
 
-    print(f"Group opened: {group_name}")
+    logger.info("Group opened: %s", group_name)
 
 
 
 def read_messages(driver, message_count):
     """Read last N WhatsApp messages"""
-    print(f"Reading last {message_count} messages...")
+    logger.info("Reading last %d messages...", message_count)
+
+    # Load messages - return as soon as enough are rendered, scroll up for more history otherwise
+    def enough_messages(d):
+        # Count in the page - returns one int instead of a WebElement reference per message
+        return d.execute_script(COUNT_MESSAGES_JS, MESSAGE_SELECTOR) >= MIN_LOADED_MESSAGES
 
-    # Load messages
+    panel = None
     max_attempts = 5
     for attempt in range(max_attempts):
-        messages = driver.find_elements(By.CSS_SELECTOR, '[data-pre-plain-text]')
-        if len(messages) < 5:
-            print(f"Found {len(messages)} messages, loading more… ({attempt+1}/{max_attempts})")
+        try:
+            WebDriverWait(driver, MESSAGE_LOAD_TIMEOUT, poll_frequency=0.25).until(enough_messages)
+            break
+        except TimeoutException:
+            logger.info("Not enough messages yet, loading more… (%d/%d)", attempt + 1, max_attempts)
             try:
-                panel = driver.find_element(By.CSS_SELECTOR, "div[data-testid='conversation-panel-body']")
+                # Look the panel up once and reuse it for later scroll attempts
+                if panel is None:
+                    panel = driver.find_element(*CONVERSATION_PANEL_LOCATOR)
                 driver.execute_script("arguments[0].scrollTop = 0", panel)
             except:
-                pass
-            time.sleep(3)
-        else:
-            break
+                panel = None
 
-    messages = driver.find_elements(By.CSS_SELECTOR, '[data-pre-plain-text]')
-    last_messages = messages[-message_count:] if len(messages) >= message_count else messages
+    # Collect metadata + text of the last N messages in one browser round-trip
+    raw_messages = driver.execute_script(READ_MESSAGES_JS, message_count, MESSAGE_SELECTOR)
 
     data = []
-    for msg in last_messages:
-        try:
-            meta = msg.get_attribute("data-pre-plain-text")
-            if meta:
-                meta = meta.strip("[]")
-                timestamp, sender = meta.split("] ")[0], meta.split("] ")[1].replace(":", "")
-            else:
-                timestamp, sender = "?", "?"
-
-            # WhatsApp Web 2025+ message text selector
-            text_elems = msg.find_elements(
-                By.CSS_SELECTOR,
-                'span[dir="ltr"], span[dir="rtl"]'
-            )
-
-            text = " ".join(t.text for t in text_elems).strip()
+    for raw in raw_messages:
+        meta = raw.get("meta")
+        if meta:
+            # "[HH:MM, DD/MM/YYYY] Sender: "
+            meta = meta.strip("[]")
+            if "] " not in meta:
+                logger.warning("Skipping message with unexpected metadata: %r", meta)
+                continue
+            timestamp, _, sender = meta.partition("] ")
+            sender = sender.replace(":", "")
+        else:
+            timestamp, sender = "?", "?"
 
+        text = (raw.get("text") or "").strip()
 
-            data.append({
-                "sender": sender,
-                "timestamp": timestamp,
-                "text": text
-            })
-        except Exception as e:
-            print("Error:", e)
+        data.append({
+            "sender": sender,
+            "timestamp": timestamp,
+            "text": text
+        })
 
-    print(f"{len(data)} messages read.")
+    logger.info("%d messages read.", len(data))
     return data
 
 
 def run_multi_group_reader():
-    load_dotenv()
-
-    STUDENTS = os.getenv("STUDENTS_GROUP")
-    SALES = os.getenv("SALES_TEAM_GROUP")
-    MESSAGE_COUNT = int(os.getenv("MESSAGE_COUNT"))
-
     driver, wait = open_whatsapp_browser()
 
     try:
         # --- Group 1 ---
-        open_group(driver, wait, STUDENTS)
+        open_group(driver, wait, STUDENTS_GROUP)
         students_messages = read_messages(driver, MESSAGE_COUNT)
-        print(students_messages)
+        logger.debug("Students messages: %s", students_messages)
         # --- Group 2 ---
-        open_group(driver, wait, SALES)
+        open_group(driver, wait, SALES_TEAM_GROUP)
         sales_messages = read_messages(driver, MESSAGE_COUNT)
 
-        print("=== Done Extracting Messages ===")
+        logger.info("=== Done Extracting Messages ===")
         return {
             "students": students_messages,
             "sales": sales_messages
         }
 
     finally:
-        driver.quit()
\ No newline at end of file
+        # Tear Chrome down in the background so the load stages can start right away.
+        # Non-daemon: the interpreter still waits for quit() before exiting.
+        threading.Thread(target=driver.quit, name="chrome-quit").start()
\ No newline at end of file
@@ -1,5 +1,5 @@
 import os
-from src.sheets_connect import init_google_sheets
+from src.sheets_connect import get_worksheet
 from dotenv import load_dotenv
 
 # Load environment variables once at module level
@@ -9,6 +9,7 @@ def find_next_empty_row(sheet, column='B'):
     """
     Find the next empty row by checking column B.
     Column A is reserved for checkboxes.
+    Read fresh on every upload - the sales team edits column B between runs.
     """
     # Get all values from column B
     col_values = sheet.col_values(2)  # Column B is index 2
@@ -76,9 +77,7 @@ def get_sales_worksheet():
     if not sheet_id:
         raise ValueError("SALES_SHEET_ID not found in environment variables")
     
-    client = init_google_sheets()
-    spreadsheet = client.open_by_key(sheet_id)
-    worksheet = spreadsheet.worksheet("main")
+    worksheet = get_worksheet(sheet_id, "main")
     
     print(f"✓ Connected to sales spreadsheet")
     return worksheet
\ No newline at end of file
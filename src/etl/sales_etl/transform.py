@@ -1,5 +1,6 @@
 import re
 from datetime import datetime
+from operator import itemgetter
 from src.etl.db.mongodb.mongo_handler import get_mongo_connection
 
 def parse_whatsapp_timestamp(timestamp_str):
@@ -197,10 +198,19 @@ def process_sales_messages(messages):
     
     leads = []
     latest_timestamp = None
+    seen = set()
+    duplicates = 0
     
     for msg in new_messages:
         text = msg.get("text", "")
         
+        # Skip exact duplicates within this batch (same text at the same time)
+        key = (msg.get("timestamp", ""), text)
+        if key in seen:
+            duplicates += 1
+            continue
+        seen.add(key)
+        
         # Try to extract lead info
         lead_info = extract_lead_info(text)
         
@@ -228,12 +238,17 @@ def process_sales_messages(messages):
     print(f"{'='*60}")
     print(f"Total messages scanned: {len(messages)}")
     print(f"New messages processed: {len(new_messages)}")
+    print(f"Duplicates skipped: {duplicates}")
     print(f"Leads found: {len(leads)}")
     print(f"{'='*60}")
     
     return leads
 
 
+# Sheet column order B-F; every lead from process_sales_messages carries all five keys
+_lead_row = itemgetter("timestamp", "שם", "טלפון", "מייל", "מקור")
+
+
 def format_single_lead_for_sheets(lead):
     """
     Format a single lead according to the column structure:
@@ -243,17 +258,11 @@ def format_single_lead_for_sheets(lead):
     E: email (מייל)
     F: source (מקור)
     """
-    return [
-        lead.get("timestamp", ""),
-        lead.get("שם", ""),
-        lead.get("טלפון", ""),
-        lead.get("מייל", ""),
-        lead.get("מקור", "")
-    ]
+    return list(_lead_row(lead))
 
 
 def format_leads_for_sheets(leads):
     """
     Format all leads for batch Google Sheets insertion.
     """
-    return [format_single_lead_for_sheets(lead) for lead in leads]
\ No newline at end of file
+    return [format_single_lead_for_sheets(lead) for lead in leads]
@@ -1,78 +1,199 @@
 import hashlib
+import logging
+import os
+import re
+from bisect import bisect_right
 from datetime import datetime
-from typing import List, Dict, Any
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Optional
 from collections import defaultdict
 
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
 from src.etl.db.mongodb.mongo_handler import get_mongo_connection, MongoDBConnection
 
+logger = logging.getLogger(__name__)
+
+# Coerce lesson field types on every load; set STUDENTS_LEGACY_LESSON_DOCS=false once
+# migrate_existing_data has run and all lessons are known to be well-typed
+LEGACY_LESSON_DOCS = os.getenv("STUDENTS_LEGACY_LESSON_DOCS", "true").lower() not in ("0", "false", "no")
+
+# Maximum upserts sent in a single bulk_write
+BULK_WRITE_CHUNK_SIZE = 1000
+
+# Fields process_student_messages reads from an existing student document
+EXISTING_STUDENT_PROJECTION = {
+    '_id': 0,
+    'uniq_id': 1,
+    'last_message_timedate': 1,
+    'last_practice_timedate': 1,
+    'current_lesson': 1,
+    'lessons': 1,
+}
+
+
+def _is_fixed_width_timestamp(timestamp_str: str) -> bool:
+    """Check for the zero-padded 'HH:MM, DD.MM.YYYY' layout (17 chars) that format_timestamp writes."""
+    if not (
+        len(timestamp_str) == 17
+        and timestamp_str[2] == ':'
+        and timestamp_str[5:7] == ', '
+        and timestamp_str[9] == '.'
+        and timestamp_str[12] == '.'
+    ):
+        return False
+    
+    # Every field must be ASCII digits - int() would also accept spaces and other Unicode digits
+    digits = (
+        timestamp_str[0:2] + timestamp_str[3:5] + timestamp_str[7:9]
+        + timestamp_str[10:12] + timestamp_str[13:17]
+    )
+    return digits.isascii() and digits.isdigit()
+
 
+@lru_cache(maxsize=131072)
 def parse_timestamp(timestamp_str: str) -> datetime:
     """
     Parse timestamp string in multiple formats to datetime object.
     Supports:
     - ISO 8601: '2025-12-02T16:15:42.998+00:00'
     - Custom format: 'HH:MM, DD.MM.YYYY'
+    Results are memoized (datetimes are immutable); load() clears the cache per run.
     """
     try:
         # Try ISO 8601 format first
         if 'T' in timestamp_str:
             # Handle ISO format with timezone
             return datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        elif _is_fixed_width_timestamp(timestamp_str):
+            # Zero-padded 'HH:MM, DD.MM.YYYY' - slice the fields directly
+            return datetime(
+                int(timestamp_str[13:17]), int(timestamp_str[10:12]), int(timestamp_str[7:9]),
+                int(timestamp_str[0:2]), int(timestamp_str[3:5])
+            )
         else:
-            # Handle custom format
+            # Handle custom format (non-padded variants)
             return datetime.strptime(timestamp_str, '%H:%M, %d.%m.%Y')
     except Exception as e:
-        print(f"Error parsing timestamp '{timestamp_str}': {e}")
+        logger.warning("Error parsing timestamp '%s': %s", timestamp_str, e)
         raise
 
 
+@lru_cache(maxsize=65536)
 def format_timestamp(dt: datetime) -> str:
     """
     Format datetime object to string in format 'HH:MM, DD.MM.YYYY'
     Uses zero-padded format for consistency
+    Memoized like parse_timestamp and cleared with it at the start of load().
     """
     return dt.strftime('%H:%M, %d.%m.%Y')
 
 
+_LESSON_NUMBER_RE = re.compile(r'\d+')
+
+
+def _lesson_sort_key(lesson: Dict[str, Any]) -> int:
+    """Sort lessons by their number; lessons without one go last."""
+    match = _LESSON_NUMBER_RE.search(str(lesson['lesson']))
+    return int(match.group()) if match else 9999
+
+
+def _coerce_lesson_types(lesson: Dict[str, Any]) -> bool:
+    """
+    Coerce counters/flags that older versions may have stored as other types
+    (practice_count/message_count -> int, paid -> bool), in place.
+    Returns True if any value was changed.
+    """
+    changed = False
+
+    for key in ('practice_count', 'message_count'):
+        if key in lesson:
+            value = lesson[key]
+            try:
+                coerced = int(value)
+            except (ValueError, TypeError):
+                coerced = 0
+            if type(value) is not int or value != coerced:
+                lesson[key] = coerced
+                changed = True
+
+    if 'paid' in lesson and type(lesson['paid']) is not bool:
+        lesson['paid'] = bool(lesson['paid'])
+        changed = True
+
+    return changed
+
+
 def generate_uniq_id(phone_number: str, name: str) -> str:
-    """Generate a unique ID by hashing phone number and name."""
-    combined = f"{phone_number}_{name}"
-    return hashlib.md5(combined.encode()).hexdigest()
+    """
+    Generate a unique ID by hashing phone number and name.
+    MD5 is kept on purpose: uniq_id is the persisted upsert key, so changing the
+    digest would orphan every existing student document.
+    """
+    return hashlib.md5(b"_".join((phone_number.encode(), name.encode()))).hexdigest()
+
+
+def generate_uniq_ids(students: List[tuple]) -> List[str]:
+    """
+    Generate unique IDs for a batch of (phone_number, name) pairs.
+    Delegates to generate_uniq_id so the persisted key is defined in one place.
+    """
+    return [generate_uniq_id(phone, name) for phone, name in students]
 
 
-def aggregate_student_updates(transformed_records: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+def aggregate_student_updates(transformed_records: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
     """
     Group transformed records by student (phone_number).
     This allows us to process all messages for a student together.
+    Message type counts are tallied in the same pass.
     
-    Returns: Dict with phone_number as key and list of messages as value
+    Returns: Dict with phone_number as key and
+             {'msgs': [records], 'n_message': int, 'n_practice': int} as value
     """
-    student_messages = defaultdict(list)
+    student_messages = defaultdict(lambda: {'msgs': [], 'n_message': 0, 'n_practice': 0})
+    
+    get_keys = itemgetter('phone_number', 'message_type')
     
     for record in transformed_records:
-        phone_number = record['phone_number']
-        student_messages[phone_number].append(record)
+        phone_number, message_type = get_keys(record)
+        entry = student_messages[phone_number]
+        entry['msgs'].append(record)
+        
+        if message_type == 'message':
+            entry['n_message'] += 1
+        elif message_type == 'practice':
+            entry['n_practice'] += 1
     
     return student_messages
 
 
-def process_student_messages(student_messages: List[Dict[str, Any]], stats_collection) -> Dict[str, Any]:
+def process_student_messages(student_messages: List[Dict[str, Any]], existing_doc: Optional[Dict[str, Any]], uniq_id: str = None, now: str = None) -> Optional[Dict[str, Any]]:
     """
     Process all messages for a single student and build MongoDB update operations.
     Clean, predictable, auto-advancing lessons, duplicate-safe.
+    existing_doc is the student's current stats document (None for a new student),
+    prefetched by load() for the whole batch.
+    now is the run's "HH:MM, DD.MM.YYYY" timestamp, shared by every student in a load.
+    Returns None when the stored document would not change.
     """
     first_msg = student_messages[0]
     phone_number = first_msg['phone_number']
     name = first_msg['name']
     current_lesson = first_msg['lesson']
-    uniq_id = generate_uniq_id(phone_number, name)
-
-    # Fetch existing student
-    existing_doc = stats_collection.find_one({'uniq_id': uniq_id})
+    if uniq_id is None:
+        uniq_id = generate_uniq_id(phone_number, name)
 
     existing_last_message = None
     existing_last_practice = None
 
+    # Whether this run changes anything in the stored document
+    changed = (
+        not existing_doc
+        or existing_doc.get('current_lesson') != current_lesson
+    )
+
     if existing_doc:
         if existing_doc.get('last_message_timedate'):
             val = existing_doc['last_message_timedate']
@@ -83,67 +204,70 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
             existing_last_practice = parse_timestamp(val) if isinstance(val, str) else val
 
     # Load lessons into dict
+    # existing_doc was decoded fresh for this run, so its lesson dicts are normalized in place
     lessons_dict = {}
     if existing_doc and 'lessons' in existing_doc:
         for lesson in existing_doc['lessons']:
             if not isinstance(lesson, dict):
-                print(f"⚠ Corrupt lesson structure in DB for {name}, skipping: {lesson}")
+                logger.warning("⚠ Corrupt lesson structure in DB for %s, skipping: %s", name, lesson)
                 continue
 
-            lesson_copy = lesson.copy()
-
-            if 'lesson' not in lesson_copy:
-                print(f"⚠ Lesson entry missing 'lesson' key for {name}, skipping: {lesson_copy}")
+            if 'lesson' not in lesson:
+                logger.warning("⚠ Lesson entry missing 'lesson' key for %s, skipping: %s", name, lesson)
                 continue
 
             # Parse timestamps
             for key in ['first_practice', 'last_practice']:
-                if key in lesson_copy and isinstance(lesson_copy[key], str):
+                if key in lesson and isinstance(lesson[key], str):
                     try:
-                        lesson_copy[key] = parse_timestamp(lesson_copy[key])
+                        lesson[key] = parse_timestamp(lesson[key])
                     except:
                         pass
 
-            # Ensure practice_count is an integer
-            if 'practice_count' in lesson_copy:
-                try:
-                    lesson_copy['practice_count'] = int(lesson_copy['practice_count'])
-                except (ValueError, TypeError):
-                    lesson_copy['practice_count'] = 0
+            # Every lesson must carry message_count and paid (backward compatibility)
+            if 'message_count' not in lesson:
+                lesson['message_count'] = 0
+                changed = True
 
-            # Ensure message_count exists (backward compatibility)
-            if 'message_count' not in lesson_copy:
-                lesson_copy['message_count'] = 0
-            else:
-                try:
-                    lesson_copy['message_count'] = int(lesson_copy['message_count'])
-                except (ValueError, TypeError):
-                    lesson_copy['message_count'] = 0
-
-            # Ensure paid exists (backward compatibility - default to False)
-            if 'paid' not in lesson_copy:
-                lesson_copy['paid'] = False
-            else:
-                # Ensure it's a boolean
-                lesson_copy['paid'] = bool(lesson_copy['paid'])
+            if 'paid' not in lesson:
+                lesson['paid'] = False
+                changed = True
 
-            lessons_dict[lesson_copy['lesson']] = lesson_copy
+            # A corrected type counts as a change so the fixed value is written back
+            if LEGACY_LESSON_DOCS and _coerce_lesson_types(lesson):
+                changed = True
+
+            lessons_dict[lesson['lesson']] = lesson
 
     last_message_timedate = None
     last_practice_timedate = None
 
+    # Parse each timestamp once and walk messages oldest-first (stable for equal times).
+    # The stored "HH:MM, DD.MM.YYYY" strings do not sort chronologically, so sort on datetimes.
+    parsed_messages = sorted(
+        ((parse_timestamp(msg['current_timestamp']), msg) for msg in student_messages),
+        key=itemgetter(0)
+    )
+    timestamps = [ts for ts, _ in parsed_messages]
+
+    # Anything at or before both stored watermarks is already loaded whatever its type
+    start = 0
+    if existing_last_message and existing_last_practice:
+        start = bisect_right(timestamps, min(existing_last_message, existing_last_practice))
+
+    # Input is sorted, so one watermark per type - the stored value, then the last accepted
+    # timestamp - covers both the DB and in-batch duplicate checks. Equal times count as duplicates.
+    message_watermark = existing_last_message
+    practice_watermark = existing_last_practice
+
     # PROCESS INPUT MESSAGES
-    for msg in student_messages:
+    for ts, msg in parsed_messages[start:]:
         msg_type = msg['message_type']
-        ts = parse_timestamp(msg['current_timestamp'])
         msg_lesson = msg['lesson']
         msg_teacher = msg['teacher']
 
         if msg_type == 'message':
-            if existing_last_message and ts <= existing_last_message:
-                continue
-
-            if last_message_timedate and ts <= last_message_timedate:
+            if message_watermark and ts <= message_watermark:
                 continue
 
             # Increment message count at lesson level
@@ -162,20 +286,18 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
                     'paid': False
                 }
 
-            if not last_message_timedate or ts > last_message_timedate:
-                last_message_timedate = ts
+            last_message_timedate = message_watermark = ts
 
         elif msg_type == 'practice':
-            if existing_last_practice and ts <= existing_last_practice:
-                continue
-
-            if last_practice_timedate and ts <= last_practice_timedate:
+            if practice_watermark and ts <= practice_watermark:
                 continue
 
             if msg_lesson in lessons_dict:
                 lesson_entry = lessons_dict[msg_lesson]
+                # Lessons created from a plain message have last_practice = None
+                lesson_last_practice = lesson_entry.get('last_practice') or datetime.min
 
-                if ts > lesson_entry.get('last_practice', datetime.min):
+                if ts > lesson_last_practice:
                     lesson_entry['practice_count'] = lesson_entry.get('practice_count', 0) + 1
                     lesson_entry['teacher'] = msg_teacher
                     lesson_entry['last_practice'] = ts
@@ -183,8 +305,7 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
                     if not lesson_entry.get('first_practice'):
                         lesson_entry['first_practice'] = ts
 
-                    if not last_practice_timedate or ts > last_practice_timedate:
-                        last_practice_timedate = ts
+                    last_practice_timedate = practice_watermark = ts
                 else:
                     continue
             else:
@@ -198,11 +319,14 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
                     'paid': False
                 }
 
-                if not last_practice_timedate or ts > last_practice_timedate:
-                    last_practice_timedate = ts
+                last_practice_timedate = practice_watermark = ts
+
+        # Only accepted messages reach this point
+        changed = True
 
     # AUTO-ADD CURRENT LESSON
     if current_lesson not in lessons_dict:
+        changed = True
         lessons_dict[current_lesson] = {
             'lesson': current_lesson,
             'teacher': first_msg['teacher'],
@@ -213,14 +337,15 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
             'paid': False
         }
 
-    # SORT LESSONS
-    def extract_number(lesson_name):
-        try:
-            return int(''.join(filter(str.isdigit, lesson_name)))
-        except:
-            return 9999
+    # Nothing new for this student - skip the write entirely
+    if not changed:
+        return None
 
-    lessons_list = sorted(lessons_dict.values(), key=lambda x: extract_number(x['lesson']))
+    if now is None:
+        now = MongoDBConnection.get_current_timestamp()
+
+    # SORT LESSONS
+    lessons_list = sorted(lessons_dict.values(), key=_lesson_sort_key)
 
     # --- CLEAN LESSONS BEFORE SAVING (convert datetimes to strings) ---
     for lesson in lessons_list:
@@ -234,7 +359,7 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
         'name': name,
         'current_lesson': current_lesson,
         'lessons': lessons_list,
-        'updated_at': MongoDBConnection.get_current_timestamp(),
+        'updated_at': now,
     }
 
     if last_message_timedate:
@@ -244,13 +369,10 @@ def process_student_messages(student_messages: List[Dict[str, Any]], stats_colle
         set_ops['last_practice_timedate'] = format_timestamp(last_practice_timedate)
 
     if not existing_doc:
-        set_ops['created_at'] = MongoDBConnection.get_current_timestamp()
+        set_ops['created_at'] = now
 
     update_doc = {'$set': set_ops}
 
-    # Remove deprecated total_messages field if it exists
-    update_doc['$unset'] = {'total_messages': ""}
-
     return {
         'filter': {'uniq_id': uniq_id},
         'update': update_doc,
@@ -265,19 +387,24 @@ def load(transformed_records: List[Dict[str, Any]]) -> Dict[str, Any]:
     Load transformed records into MongoDB student_stats collection.
     """
     if not transformed_records:
-        print("No records to load")
+        logger.info("No records to load")
         return {
             'students_processed': 0,
             'new_students': 0,
             'updated_students': 0,
+            'unchanged': 0,
             'messages_loaded': 0,
             'practices_loaded': 0,
             'errors': 0
         }
     
-    print(f"\n{'='*60}")
-    print(f"Starting load for {len(transformed_records)} records")
-    print(f"{'='*60}")
+    # Bound the timestamp caches to a single run
+    parse_timestamp.cache_clear()
+    format_timestamp.cache_clear()
+    
+    logger.info("=" * 60)
+    logger.info("Starting load for %d records", len(transformed_records))
+    logger.info("=" * 60)
     
     # Get MongoDB connection
     mongo_conn = get_mongo_connection()
@@ -286,66 +413,122 @@ def load(transformed_records: List[Dict[str, Any]]) -> Dict[str, Any]:
     # Aggregate messages by student
     student_messages_map = aggregate_student_updates(transformed_records)
     
-    print(f"Processing {len(student_messages_map)} students")
+    logger.info("Processing %d students", len(student_messages_map))
     
     # Statistics
     stats = {
         'students_processed': 0,
         'new_students': 0,
         'updated_students': 0,
+        'unchanged': 0,
         'messages_loaded': 0,
         'practices_loaded': 0,
         'errors': 0
     }
     
-    # Process each student
-    for phone_number, student_messages in student_messages_map.items():
+    # Hash every student's uniq_id in one pass
+    uniq_ids = generate_uniq_ids(
+        [(phone, entry['msgs'][0]['name']) for phone, entry in student_messages_map.items()]
+    )
+    
+    # Fetch every existing student document for this batch in one query
+    existing_docs = {
+        doc['uniq_id']: doc
+        for doc in stats_collection.find(
+            {'uniq_id': {'$in': uniq_ids}},
+            projection=EXISTING_STUDENT_PROJECTION
+        )
+    }
+    
+    # One timestamp for every write in this run
+    now = MongoDBConnection.get_current_timestamp()
+    
+    # Build one upsert per student; they go out in chunked bulk_writes below
+    operations = []
+    pending = []
+
+    for (phone_number, entry), uniq_id in zip(student_messages_map.items(), uniq_ids):
+        student_messages = entry['msgs']
+        message_count = entry['n_message']
+        practice_count = entry['n_practice']
         try:
-            # Count message types
-            message_count = sum(1 for msg in student_messages if msg['message_type'] == 'message')
-            practice_count = sum(1 for msg in student_messages if msg['message_type'] == 'practice')
-            
             # Process all messages for this student
-            update_operation = process_student_messages(student_messages, stats_collection)
+            update_operation = process_student_messages(student_messages, existing_docs.get(uniq_id), uniq_id, now)
+            if update_operation is None:
+                stats['unchanged'] += 1
+                logger.debug("- UNCHANGED: %s (%s)", student_messages[0]['name'], phone_number)
+                continue
             
-            # Execute MongoDB update
-            result = stats_collection.update_one(
+            operations.append(UpdateOne(
                 update_operation['filter'],
                 update_operation['update'],
                 upsert=update_operation['upsert']
-            )
-            
-            # Update statistics
-            stats['students_processed'] += 1
-            
-            # Track new vs updated based on upserted_id presence
-            if result.upserted_id or update_operation['is_new']:
-                stats['new_students'] += 1
-            else:
-                stats['updated_students'] += 1
-            
-            stats['messages_loaded'] += message_count
-            stats['practices_loaded'] += practice_count
-            
-            student_name = student_messages[0]['name']
-            status = "NEW" if (result.upserted_id or update_operation['is_new']) else "UPDATED"
-            print(f"✓ {status}: {student_name} ({phone_number}) - {message_count} messages, {practice_count} practices")
+            ))
+            pending.append({
+                'phone_number': phone_number,
+                'name': student_messages[0]['name'],
+                'message_count': message_count,
+                'practice_count': practice_count
+            })
             
         except Exception as e:
             stats['errors'] += 1
-            print(f"✗ Error processing {phone_number}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("✗ Error processing %s: %s", phone_number, e)
+    
+    # Execute MongoDB updates as unordered bulk writes, BULK_WRITE_CHUNK_SIZE per round-trip
+    # NEW vs UPDATED comes from what the server actually upserted (race-safe)
+    failed_indexes = set()
+    upserted_indexes = set()
+    for offset in range(0, len(operations), BULK_WRITE_CHUNK_SIZE):
+        chunk = operations[offset:offset + BULK_WRITE_CHUNK_SIZE]
+        try:
+            result = stats_collection.bulk_write(chunk, ordered=False)
+            upserted_indexes.update(offset + idx for idx in result.upserted_ids)
+        except BulkWriteError as e:
+            # writeErrors / upserted indexes are relative to the chunk
+            upserted_indexes.update(offset + u['index'] for u in e.details.get('upserted', []))
+            for err in e.details.get('writeErrors', []):
+                idx = offset + err['index']
+                failed_indexes.add(idx)
+                logger.error("✗ Error writing %s: %s", pending[idx]['phone_number'], err.get('errmsg'))
+        except Exception as e:
+            failed_indexes.update(range(offset, offset + len(chunk)))
+            logger.exception("✗ Bulk write failed: %s", e)
+    
+    # Update statistics
+    for idx, student in enumerate(pending):
+        if idx in failed_indexes:
+            stats['errors'] += 1
+            continue
+        
+        stats['students_processed'] += 1
+        
+        is_new = idx in upserted_indexes
+        if is_new:
+            stats['new_students'] += 1
+        else:
+            stats['updated_students'] += 1
+        
+        stats['messages_loaded'] += student['message_count']
+        stats['practices_loaded'] += student['practice_count']
+        
+        status = "NEW" if is_new else "UPDATED"
+        logger.info(
+            "✓ %s: %s (%s) - %d messages, %d practices",
+            status, student['name'], student['phone_number'],
+            student['message_count'], student['practice_count']
+        )
     
-    print(f"\n{'='*60}")
-    print(f"Load complete:")
-    print(f"  Students processed: {stats['students_processed']}")
-    print(f"  New students: {stats['new_students']}")
-    print(f"  Updated students: {stats['updated_students']}")
-    print(f"  Messages loaded: {stats['messages_loaded']}")
-    print(f"  Practices loaded: {stats['practices_loaded']}")
-    print(f"  Errors: {stats['errors']}")
-    print(f"{'='*60}\n")
+    logger.info("=" * 60)
+    logger.info("Load complete:")
+    logger.info("  Students processed: %d", stats['students_processed'])
+    logger.info("  New students: %d", stats['new_students'])
+    logger.info("  Updated students: %d", stats['updated_students'])
+    logger.info("  Unchanged (write skipped): %d", stats['unchanged'])
+    logger.info("  Messages loaded: %d", stats['messages_loaded'])
+    logger.info("  Practices loaded: %d", stats['practices_loaded'])
+    logger.info("  Errors: %d", stats['errors'])
+    logger.info("=" * 60)
 
     return stats
 
@@ -357,80 +540,126 @@ def migrate_existing_data():
     This function:
     1. Adds 'paid' field (default: False) to lessons missing it
     2. Adds 'message_count' field (default: 0) to lessons missing it
-    3. Preserves all existing data
+    3. Converts practice_count/message_count to int and paid to bool
+    4. Removes the deprecated top-level 'total_messages' field
+    5. Preserves all existing data
 
     Run this once after deploying the new code to migrate existing records.
-    Safe to run multiple times - it only updates missing fields.
+    Safe to run multiple times - it only updates missing or mistyped fields.
     """
-    print(f"\n{'='*60}")
-    print("MIGRATION: Adding new fields to existing lesson records")
-    print(f"{'='*60}\n")
+    logger.info("=" * 60)
+    logger.info("MIGRATION: Adding new fields to existing lesson records")
+    logger.info("=" * 60)
 
     mongo_conn = get_mongo_connection()
     stats_collection = mongo_conn.get_students_stats_collection()
 
-    # Find all student documents
-    all_students = stats_collection.find({})
+    # Drop the deprecated total_messages field server-side in one call
+    unset_result = stats_collection.update_many(
+        {'total_messages': {'$exists': True}},
+        {'$unset': {'total_messages': ""}}
+    )
+    logger.info("✓ Removed total_messages from %d documents", unset_result.modified_count)
+
+    # Stream all student documents in large batches, fetching only the fields the migration reads
+    all_students = stats_collection.find(
+        {},
+        projection={'uniq_id': 1, 'name': 1, 'lessons': 1},
+        batch_size=BULK_WRITE_CHUNK_SIZE
+    )
 
     migrated_count = 0
     error_count = 0
 
+    # One timestamp for the whole migration run
+    now = MongoDBConnection.get_current_timestamp()
+
+    # Pending updates, written BULK_WRITE_CHUNK_SIZE at a time
+    operations = []
+    pending_names = []
+
+    def flush():
+        nonlocal migrated_count, error_count
+        if not operations:
+            return
+
+        failed = set()
+        try:
+            stats_collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get('writeErrors', []):
+                failed.add(err['index'])
+                logger.error("✗ Error migrating student %s: %s", pending_names[err['index']], err.get('errmsg'))
+        except Exception as e:
+            failed = set(range(len(operations)))
+            logger.exception("✗ Bulk migration write failed: %s", e)
+
+        for idx, name in enumerate(pending_names):
+            if idx in failed:
+                error_count += 1
+            else:
+                migrated_count += 1
+                logger.info("✓ Migrated: %s", name)
+
+        operations.clear()
+        pending_names.clear()
+
     for student in all_students:
         try:
-            uniq_id = student.get('uniq_id')
             name = student.get('name', 'Unknown')
             lessons = student.get('lessons', [])
 
             if not lessons:
                 continue
 
-            updated_lessons = []
             needs_update = False
 
+            # Each cursor document is a fresh dict, so lessons are patched in place
             for lesson in lessons:
                 if not isinstance(lesson, dict):
-                    updated_lessons.append(lesson)
                     continue
 
-                lesson_copy = lesson.copy()
-
                 # Add paid field if missing
-                if 'paid' not in lesson_copy:
-                    lesson_copy['paid'] = False
+                if 'paid' not in lesson:
+                    lesson['paid'] = False
                     needs_update = True
 
                 # Add message_count field if missing
-                if 'message_count' not in lesson_copy:
-                    lesson_copy['message_count'] = 0
+                if 'message_count' not in lesson:
+                    lesson['message_count'] = 0
                     needs_update = True
 
-                updated_lessons.append(lesson_copy)
+                # Store counters as int and paid as bool
+                if _coerce_lesson_types(lesson):
+                    needs_update = True
 
-            # Update document if any lessons were modified
+            # Queue an update if any lessons were modified
             if needs_update:
-                stats_collection.update_one(
-                    {'uniq_id': uniq_id},
+                operations.append(UpdateOne(
+                    {'_id': student['_id']},
                     {
                         '$set': {
-                            'lessons': updated_lessons,
-                            'updated_at': MongoDBConnection.get_current_timestamp()
+                            'lessons': lessons,
+                            'updated_at': now
                         }
                     }
-                )
-                migrated_count += 1
-                print(f"✓ Migrated: {name} ({len(updated_lessons)} lessons)")
+                ))
+                pending_names.append(name)
+
+                if len(operations) >= BULK_WRITE_CHUNK_SIZE:
+                    flush()
 
         except Exception as e:
             error_count += 1
-            print(f"✗ Error migrating student {student.get('name', 'Unknown')}: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("✗ Error migrating student %s: %s", student.get('name', 'Unknown'), e)
+
+    flush()
 
-    print(f"\n{'='*60}")
-    print(f"Migration complete:")
-    print(f"  Students migrated: {migrated_count}")
-    print(f"  Errors: {error_count}")
-    print(f"{'='*60}\n")
+    logger.info("=" * 60)
+    logger.info("Migration complete:")
+    logger.info("  Students migrated: %d", migrated_count)
+    logger.info("  Errors: %d", error_count)
+    logger.info("=" * 60)
 
     return {'migrated': migrated_count, 'errors': error_count}
 
@@ -440,5 +669,6 @@ if __name__ == '__main__':
     Run migration to add new fields to existing data.
     Usage: python -m src.etl.students_etl.load_mongo_stats
     """
-    print("Running migration to add 'paid' and 'message_count' fields to lessons...")
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(message)s")
+    logger.info("Running migration to add 'paid' and 'message_count' fields to lessons...")
     migrate_existing_data()
\ No newline at end of file
@@ -1,9 +1,13 @@
 import os
-from datetime import datetime
-from typing import List, Dict, Any
+from datetime import datetime, date
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
+from gspread.utils import rowcol_to_a1
 
-from src.sheets_connect import init_google_sheets
+from src.etl.students_etl.transform import normalize_phone_number
+from src.sheets_connect import get_worksheet, get_sheet_values, invalidate_sheet_values
 
 # Load environment variables
 load_dotenv()
@@ -11,7 +15,56 @@ load_dotenv()
 SHEET_ID = os.getenv('SHEET_ID')
 WORKSHEET_NAME = "main"
 
+# Max ranges per values.batchUpdate request, keeps large backfills under the request size limit
+BATCH_UPDATE_CHUNK_SIZE = 500
 
+
+# Supported timestamp formats - mutually exclusive, so trying them in any order gives the same result
+_TIMESTAMP_FORMATS = (
+    '%H:%M, %m/%d/%Y',      # '18:51, 12/4/2025'
+    '%I:%M %p, %m/%d/%Y',   # '6:51 PM, 12/4/2025'
+    '%H:%M, %d.%m.%Y',      # 'HH:MM, DD.MM.YYYY'
+)
+
+# Index of the format that matched last; a batch almost always uses a single format
+_last_good_format = [0]
+
+
+def _is_number(part: str, max_len: int) -> bool:
+    return 0 < len(part) <= max_len and part.isascii() and part.isdigit()
+
+
+def _fast_parse_24h(timestamp_str: str) -> Optional[datetime]:
+    """
+    Slice-and-int parser for the two 24-hour formats ('H:MM, M/D/YYYY' and 'H:MM, D.M.YYYY').
+    Returns None for anything else so the strptime formats get a chance.
+    """
+    time_part, sep, date_part = timestamp_str.partition(', ')
+    if not sep:
+        return None
+    
+    hour, sep, minute = time_part.partition(':')
+    if not sep or not _is_number(hour, 2) or len(minute) != 2 or not _is_number(minute, 2):
+        return None
+    
+    if date_part.count('/') == 2:
+        month, day, year = date_part.split('/')
+    elif date_part.count('.') == 2:
+        day, month, year = date_part.split('.')
+    else:
+        return None
+    
+    if not (_is_number(day, 2) and _is_number(month, 2) and len(year) == 4 and _is_number(year, 4)):
+        return None
+    
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute))
+    except ValueError:
+        # Out-of-range field (e.g. month 13) - strptime would reject it too
+        return None
+
+
+@lru_cache(maxsize=4096)
 def parse_timestamp(timestamp_str: str) -> datetime:
     """
     Parse timestamp string to datetime object.
@@ -19,24 +72,45 @@ def parse_timestamp(timestamp_str: str) -> datetime:
     - '18:51, 12/4/2025' (24-hour format with M/D/YYYY)
     - '6:51 PM, 12/4/2025' (12-hour format with AM/PM)
     - 'HH:MM, DD.MM.YYYY' (24-hour format with D.M.YYYY)
+    The 24-hour formats go through a fixed-layout fast path; otherwise the last
+    matching format is tried first. Results are memoized per string.
     """
-    formats = [
-        '%H:%M, %m/%d/%Y',      # '18:51, 12/4/2025'
-        '%I:%M %p, %m/%d/%Y',   # '6:51 PM, 12/4/2025'
-        '%H:%M, %d.%m.%Y',      # 'HH:MM, DD.MM.YYYY'
-    ]
+    parsed = _fast_parse_24h(timestamp_str)
+    if parsed is not None:
+        return parsed
     
-    for fmt in formats:
+    start = _last_good_format[0]
+    count = len(_TIMESTAMP_FORMATS)
+    
+    for offset in range(count):
+        idx = (start + offset) % count
         try:
-            return datetime.strptime(timestamp_str, fmt)
+            parsed = datetime.strptime(timestamp_str, _TIMESTAMP_FORMATS[idx])
         except ValueError:
             continue
+        _last_good_format[0] = idx
+        return parsed
     
     # If none of the formats worked, raise an error
     print(f"Error parsing timestamp '{timestamp_str}': Does not match any known format")
     raise ValueError(f"Could not parse timestamp: {timestamp_str}")
 
 
+# Formats a last_practice cell may already hold (we write DD/MM/YYYY, older rows were edited by hand)
+_SHEET_DATE_FORMATS = ('%d/%m/%Y', '%d/%m/%y', '%d.%m.%Y')
+
+
+def parse_sheet_date(value: str) -> Optional[date]:
+    """Parse a last_practice cell into a date, None if empty or unrecognized."""
+    value = value.strip()
+    for fmt in _SHEET_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
 def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str, Any]:
     """
     Update Google Sheets with the latest practice date for students who practiced.
@@ -53,6 +127,7 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
         return {
             'students_updated': 0,
             'students_not_found': 0,
+            'students_unchanged': 0,
             'errors': 0
         }
     
@@ -62,12 +137,7 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
     
     # Initialize Google Sheets connection
     try:
-        client = init_google_sheets()
-        if not client:
-            raise Exception("Failed to initialize Google Sheets client")
-        
-        spreadsheet = client.open_by_key(SHEET_ID)
-        sheet = spreadsheet.worksheet(WORKSHEET_NAME)
+        sheet = get_worksheet(SHEET_ID, WORKSHEET_NAME)
     except Exception as e:
         print(f"✗ Failed to connect to Google Sheets: {e}")
         import traceback
@@ -75,6 +145,7 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
         return {
             'students_updated': 0,
             'students_not_found': 0,
+            'students_unchanged': 0,
             'errors': 1
         }
     
@@ -112,6 +183,7 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
         return {
             'students_updated': 0,
             'students_not_found': 0,
+            'students_unchanged': 0,
             'errors': 0
         }
     
@@ -119,7 +191,8 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
     
     # Get all data from sheet (assuming headers in row 1)
     try:
-        all_data = sheet.get_all_values()
+        # Reuses the snapshot the transform step already read
+        all_data = get_sheet_values(SHEET_ID, WORKSHEET_NAME)
         headers = all_data[0] if all_data else []
         rows = all_data[1:] if len(all_data) > 1 else []
     except Exception as e:
@@ -127,38 +200,50 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
         return {
             'students_updated': 0,
             'students_not_found': 0,
+            'students_unchanged': 0,
             'errors': 1
         }
     
-    # Validate headers
+    # Validate headers (first occurrence wins, like headers.index)
     expected_headers = ['phone_number', 'name', 'lesson', 'last_practice']
-    if not all(h in headers for h in expected_headers):
+    header_map = {}
+    for idx, header in enumerate(headers):
+        header_map.setdefault(header, idx)
+    
+    missing_headers = [h for h in expected_headers if h not in header_map]
+    if missing_headers:
         print(f"✗ Sheet headers don't match expected format")
         print(f"  Expected: {expected_headers}")
+        print(f"  Missing: {missing_headers}")
         print(f"  Found: {headers}")
         return {
             'students_updated': 0,
             'students_not_found': 0,
+            'students_unchanged': 0,
             'errors': 1
         }
     
     # Find column indices
-    phone_col_idx = headers.index('phone_number')
-    last_practice_col_idx = headers.index('last_practice')
+    phone_col_idx = header_map['phone_number']
+    last_practice_col_idx = header_map['last_practice']
     
     # Statistics
     stats = {
         'students_updated': 0,
         'students_not_found': 0,
+        'students_unchanged': 0,
         'errors': 0
     }
     
-    # Build a map of phone numbers to row indices
-    phone_to_row = {}
-    for idx, row in enumerate(rows):
-        if len(row) > phone_col_idx:
-            phone_number = row[phone_col_idx].strip()
-            phone_to_row[phone_number] = idx + 2  # +2 because: 0-indexed to 1-indexed, plus header row
+    # Build a map of phone numbers to row indices.
+    # Keys are normalized the same way transform normalizes record phones, otherwise
+    # '+972 ...' / bidi-wrapped cells in the sheet never match and show up as "not found".
+    get_phone = itemgetter(phone_col_idx)
+    phone_to_row = {
+        normalize_phone_number(get_phone(row)): idx + 2  # +2 because: 0-indexed to 1-indexed, plus header row
+        for idx, row in enumerate(rows)
+        if len(row) > phone_col_idx and get_phone(row).strip()
+    }
     
     # Update each student's last practice date
     updates = []
@@ -176,11 +261,18 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
             # Get row number (1-indexed for Google Sheets)
             row_num = phone_to_row[phone_number]
             
+            # Skip the write when the sheet already shows this date (compared as dates, not strings)
+            row = rows[row_num - 2]
+            current_cell = row[last_practice_col_idx] if len(row) > last_practice_col_idx else ''
+            if parse_sheet_date(current_cell) == practice_timestamp.date():
+                stats['students_unchanged'] += 1
+                continue
+            
             # Format as DD/MM/YYYY (date only)
             practice_date = practice_timestamp.strftime('%d/%m/%Y')
             
             # Prepare cell update
-            cell_address = f"{chr(65 + last_practice_col_idx)}{row_num}"  # Convert to A1 notation
+            cell_address = rowcol_to_a1(row_num, last_practice_col_idx + 1)  # Convert to A1 notation
             updates.append({
                 'range': cell_address,
                 'values': [[practice_date]]
@@ -195,22 +287,32 @@ def update_practice_dates(transformed_records: List[Dict[str, Any]]) -> Dict[str
             traceback.print_exc()
             stats['errors'] += 1
     
-    # Batch update all cells at once
+    # Batch update the cells, one request per chunk.
+    # RAW: the dates are already formatted, Sheets must not re-parse them.
     if updates:
+        written = 0
         try:
-            sheet.batch_update(updates)
+            for start in range(0, len(updates), BATCH_UPDATE_CHUNK_SIZE):
+                chunk = updates[start:start + BATCH_UPDATE_CHUNK_SIZE]
+                sheet.batch_update(chunk, value_input_option='RAW')
+                written += len(chunk)
             print(f"✓ Successfully updated {len(updates)} cells in Google Sheets")
         except Exception as e:
             print(f"✗ Failed to batch update Google Sheets: {e}")
             import traceback
             traceback.print_exc()
-            stats['errors'] += len(updates)
-            stats['students_updated'] = 0
+            # Chunks sent before the failure are already in the sheet
+            stats['errors'] += len(updates) - written
+            stats['students_updated'] = written
+        
+        if written:
+            invalidate_sheet_values(SHEET_ID, WORKSHEET_NAME)
     
     print(f"{'='*60}")
     print(f"Google Sheets update complete:")
     print(f"  Students updated: {stats['students_updated']}")
     print(f"  Students not found in sheet: {stats['students_not_found']}")
+    print(f"  Students already up to date: {stats['students_unchanged']}")
     print(f"  Errors: {stats['errors']}")
     print(f"{'='*60}")
     
@@ -1,22 +1,68 @@
 import os
+import re
+import json
+import logging
 from datetime import datetime
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 import gspread
 
 from src.etl.db.mongodb.mongo_handler import get_mongo_connection
-from src.sheets_connect import init_google_sheets
+from src.sheets_connect import get_sheet_values
+
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+
+def _parse_word_list(raw: str) -> List[str]:
+    """
+    Parse a keyword list from the environment.
+    Accepts a JSON array ('["word 1", "word,2"]') or the plain CSV form ('word1,word2').
+    A bracketed non-JSON value ('[word1,word2]') falls back to CSV inside the brackets.
+    """
+    raw = (raw or '').strip()
+    
+    if raw.startswith('['):
+        try:
+            words = [str(word) for word in json.loads(raw)]
+        except ValueError:
+            words = raw.strip('[]').split(',')
+    else:
+        words = raw.split(',')
+    
+    # Clean up whitespace from words
+    return [word.strip() for word in words if word.strip()]
+
+
 # Configuration from .env
 SHEET_ID = os.getenv('SHEET_ID')
-PRACTICE_WORDS = os.getenv('PRACTICE_WORDS', '').split(',')
-MESSAGE_WORDS = os.getenv('MESSAGE_WORDS', '').split(',')
+PRACTICE_WORDS = _parse_word_list(os.getenv('PRACTICE_WORDS', ''))
+MESSAGE_WORDS = _parse_word_list(os.getenv('MESSAGE_WORDS', ''))
+
+
+def _compile_keywords(keywords: List[str]) -> Optional[re.Pattern]:
+    """Compile keywords into one alternation pattern (None when there are no keywords)."""
+    if not keywords:
+        return None
+    return re.compile('|'.join(map(re.escape, keywords)))
 
-# Clean up whitespace from words
-PRACTICE_WORDS = [word.strip() for word in PRACTICE_WORDS if word.strip()]
-MESSAGE_WORDS = [word.strip() for word in MESSAGE_WORDS if word.strip()]
+
+# One C-level scan per message instead of a Python `in` check per keyword (case-sensitive, like before)
+_PRACTICE_RE = _compile_keywords(PRACTICE_WORDS)
+_MESSAGE_RE = _compile_keywords(MESSAGE_WORDS)
+
+# Texts shorter than the shortest keyword can't match either list (emoji/"👍" replies are common)
+_MIN_KEYWORD_LEN = min((len(word) for word in PRACTICE_WORDS + MESSAGE_WORDS), default=0)
+
+# First number after "שיעור" - a cell may repeat it ("שיעור 12שיעור 12שיעור 9")
+_LESSON_RE = re.compile(r'שיעור\D*(\d+)')
+
+# Direction marks / isolates WhatsApp wraps around phone numbers, dropped in one translate pass
+_PHONE_JUNK = dict.fromkeys(
+    map(ord, '\u200b\u200e\u200f\u202a\u202b\u202c\u202d\u202e\u2066\u2067\u2068\u2069\ufeff'),
+    None
+)
 
 
 def normalize_phone_number(phone: str) -> str:
@@ -30,7 +76,9 @@ def normalize_phone_number(phone: str) -> str:
         return ''
     
     # Remove invisible Unicode characters (left-to-right marks, zero-width spaces, etc.)
-    phone = ''.join(char for char in phone if char.isprintable())
+    phone = phone.translate(_PHONE_JUNK)
+    if not phone.isprintable():
+        phone = ''.join(char for char in phone if char.isprintable())
     
     # Remove the leading + if present
     phone = phone.lstrip('+').strip()
@@ -38,16 +86,14 @@ def normalize_phone_number(phone: str) -> str:
     return phone
 
 
-def contains_keyword(text: str, keywords: List[str]) -> bool:
-    """Check if text contains any of the keywords."""
-    return any(keyword in text for keyword in keywords)
-
-
 def determine_message_type(text: str) -> Optional[str]:
     """Determine message type based on keyword match."""
-    if contains_keyword(text, PRACTICE_WORDS):
+    if len(text) < _MIN_KEYWORD_LEN:
+        return None
+    
+    if _PRACTICE_RE is not None and _PRACTICE_RE.search(text):
         return 'practice'
-    elif contains_keyword(text, MESSAGE_WORDS):
+    elif _MESSAGE_RE is not None and _MESSAGE_RE.search(text):
         return 'message'
     return None
 
@@ -57,24 +103,14 @@ def get_students_from_sheets() -> Dict[str, Dict[str, str]]:
     Fetch student data from Google Sheets (main worksheet).
     Returns a dictionary with phone as key for fast lookup.
     """
-    client = init_google_sheets()
-    
-    if not client:
-        print("Failed to initialize Google Sheets client")
-        return {}
+    SHEET_NAME = 'main'
     
     try:
-        SHEET_NAME = 'main'
-        
-        # Open the spreadsheet and get the worksheet
-        spreadsheet = client.open_by_key(SHEET_ID)
-        worksheet = spreadsheet.worksheet(SHEET_NAME)
-        
-        # Get all values from the worksheet
-        rows = worksheet.get_all_values()
+        # Get all values from the worksheet (snapshot shared with the sheets loader)
+        rows = get_sheet_values(SHEET_ID, SHEET_NAME)
         
         if not rows:
-            print("No data found in Google Sheets")
+            logger.warning("No data found in Google Sheets")
             return {}
         
         students_dict = {}
@@ -85,7 +121,9 @@ def get_students_from_sheets() -> Dict[str, Dict[str, str]]:
                 continue
                 
             # A: phone, B: name, C: lesson, E: teacher (index 4)
-            phone = row[0].strip() if row[0] else ''
+            # get_all_values() cells are always strings, and the guard above ensures 5 columns
+            phone, name, lesson_raw, _, teacher = row[:5]
+            phone = phone.strip()
             
             if not phone:
                 continue
@@ -95,69 +133,51 @@ def get_students_from_sheets() -> Dict[str, Dict[str, str]]:
             
             # Extract lesson number from "שיעור num" format
             # Handle cases like "שיעור 12שיעור 12שיעור 9" - take only the first occurrence
-            lesson_raw = row[2].strip() if len(row) > 2 and row[2] else ''
-            
-            # Find the first occurrence of "שיעור" and extract the number after it
-            if 'שיעור' in lesson_raw:
-                # Split by 'שיעור' and get the second part (first number)
-                parts = lesson_raw.split('שיעור')
-                # Get the first non-empty part after 'שיעור'
-                for part in parts[1:]:
-                    # Extract only digits from the beginning of the part
-                    lesson_number = ''.join(c for c in part if c.isdigit())
-                    if lesson_number:
-                        break
-                else:
-                    lesson_number = ''
-            else:
-                lesson_number = ''
+            lesson_match = _LESSON_RE.search(lesson_raw)
+            lesson_number = lesson_match.group(1) if lesson_match else ''
             
             students_dict[phone] = {
-                'name': row[1].strip() if len(row) > 1 and row[1] else '',
+                'name': name.strip(),
                 'lesson': lesson_number,
-                'teacher': row[4].strip() if len(row) > 4 and row[4] else ''
+                'teacher': teacher.strip()
             }
         
-        print(f"Successfully loaded {len(students_dict)} students from Google Sheets")
+        logger.info("Successfully loaded %d students from Google Sheets", len(students_dict))
         return students_dict
         
     except gspread.exceptions.SpreadsheetNotFound:
-        print(f"Error: Spreadsheet with ID '{SHEET_ID}' not found")
+        logger.error("Error: Spreadsheet with ID '%s' not found", SHEET_ID)
         return {}
     except gspread.exceptions.WorksheetNotFound:
-        print(f"Error: Worksheet '{SHEET_NAME}' not found in spreadsheet")
+        logger.error("Error: Worksheet '%s' not found in spreadsheet", SHEET_NAME)
         return {}
     except Exception as e:
-        print(f"Error reading from Google Sheets: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error reading from Google Sheets: %s", e)
         return {}
 
 
-def get_last_message_or_practice(stats_collection, phone_number: str, message_type: str) -> Optional[datetime]:
+def get_last_messages_and_practices(stats_collection, phone_numbers) -> Dict[str, Dict[str, Any]]:
     """
-    Get the last message or practice timestamp for a student from MongoDB stats.
-    
-    Args:
-        stats_collection: MongoDB collection for student stats
-        phone_number: Student's phone number
-        message_type: 'message' or 'practice'
+    Get the last message and practice timestamps for many students from MongoDB stats
+    with a single $in query (served by the phone_number index).
     
     Returns:
-        Last timestamp or None if not found
+        Dict of phone_number -> {'last_message': ..., 'last_practice': ...} for students that have stats
     """
-    student_stat = stats_collection.find_one({'phone_number': phone_number})
+    if not phone_numbers:
+        return {}
     
-    if not student_stat:
-        return None
+    cursor = stats_collection.find(
+        {'phone_number': {'$in': list(phone_numbers)}},
+        projection={'_id': 0, 'phone_number': 1, 'last_message': 1, 'last_practice': 1}
+    )
     
-    # Get the appropriate field based on message type
-    if message_type == 'practice':
-        return student_stat.get('last_practice')
-    elif message_type == 'message':
-        return student_stat.get('last_message')
+    stats_by_phone = {}
+    for student_stat in cursor:
+        # First match wins, same as find_one
+        stats_by_phone.setdefault(student_stat['phone_number'], student_stat)
     
-    return None
+    return stats_by_phone
 
 
 def transform(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
@@ -178,24 +198,23 @@ def transform(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             'last_practice': datetime or None (from mongo) - only if message_type is 'practice'
         }
     """
-    print(f"{'='*60}")
-    print(f"Starting transform for {len(messages)} messages")
-    print(f"{'='*60}")
+    logger.info("=" * 60)
+    logger.info("Starting transform for %d messages", len(messages))
+    logger.info("=" * 60)
 
     
     # Get student data from Google Sheets
     students_dict = get_students_from_sheets()
     
     if not students_dict:
-        print("No students found in Google Sheets - cannot transform")
+        logger.warning("No students found in Google Sheets - cannot transform")
         return []
     
-    # Get MongoDB connection for stats lookup
-    mongo_conn = get_mongo_connection()
-    stats_collection = mongo_conn.get_students_stats_collection()
-    
     transformed_records = []
     
+    # Per-batch cache - the same few senders post most of the messages in a group
+    normalized_phones = {}
+    
     for msg in messages:
         # Try multiple possible field names for phone number
         phone_number = (
@@ -206,18 +225,31 @@ def transform(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             ''
         ).strip()
         
-        # Normalize phone number to match sheets format
-        phone_number = normalize_phone_number(phone_number)
+        # Normalize phone number to match sheets format (once per distinct sender)
+        raw_phone = phone_number
+        phone_number = normalized_phones.get(raw_phone)
+        if phone_number is None:
+            phone_number = normalized_phones[raw_phone] = normalize_phone_number(raw_phone)
         
         if not phone_number:
-            print(f"Warning: Message missing phone field. Available fields: {list(msg.keys())}")
+            logger.warning("Message missing phone field. Available fields: %s", list(msg.keys()))
             continue
         
         text = msg.get('text', '')
         current_timestamp = msg.get('timestamp')
         
         if not current_timestamp:
-            print(f"Warning: Message missing timestamp - skipping")
+            logger.warning("Message missing timestamp - skipping")
+            continue
+        
+        # Get student info from sheets (single lookup - None if the student doesn't exist).
+        # Checked before classification: a dict probe is cheaper than the keyword scan.
+        student_info = students_dict.get(phone_number)
+        if student_info is None:
+            # Only warn when the message is a report - a practice/message from someone
+            # missing in the sheet needs fixing; teacher/staff chatter does not.
+            if determine_message_type(text):
+                logger.warning("Phone '%s' not found in Google Sheets - skipping", phone_number)
             continue
         
         # Determine message type based on keywords
@@ -227,18 +259,7 @@ def transform(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             # Skip messages that don't match any keywords
             continue
         
-        # Check if student exists in sheets
-        if phone_number not in students_dict:
-            print(f"Warning: Phone '{phone_number}' not found in Google Sheets - skipping")
-            continue
-        
-        # Get student info from sheets
-        student_info = students_dict[phone_number]
-        
-        # Get the relevant last timestamp from MongoDB based on message type
-        last_timestamp = get_last_message_or_practice(stats_collection, phone_number, message_type)
-        
-        # Build transformed record with only the relevant last_ field
+        # Build transformed record (the relevant last_ field is filled in below)
         transformed_record = {
             'message_type': message_type,
             'phone_number': phone_number,
@@ -248,19 +269,27 @@ def transform(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             'current_timestamp': current_timestamp
         }
         
-        # Add only the relevant last_ field based on message type
-        if message_type == 'message':
-            transformed_record['last_message'] = last_timestamp
-        elif message_type == 'practice':
-            transformed_record['last_practice'] = last_timestamp
-        
         transformed_records.append(transformed_record)
         
-        print(f"✓ Transformed: {student_info['name']} ({phone_number}) - Type: {message_type}")
+        logger.debug("Transformed: %s (%s) - Type: %s", student_info['name'], phone_number, message_type)
+    
+    if transformed_records:
+        # Get the last timestamps of every student in the batch from MongoDB in one query
+        mongo_conn = get_mongo_connection()
+        stats_collection = mongo_conn.get_students_stats_collection()
+        stats_by_phone = get_last_messages_and_practices(
+            stats_collection,
+            {record['phone_number'] for record in transformed_records}
+        )
+        
+        # Add only the relevant last_ field based on message type
+        for record in transformed_records:
+            field = 'last_' + record['message_type']
+            record[field] = stats_by_phone.get(record['phone_number'], {}).get(field)
     
-    print(f"\n{'='*60}")
-    print(f"Transform complete: {len(transformed_records)} records")
-    print(f"{'='*60}\n")
+    logger.info("=" * 60)
+    logger.info("Transform complete: %d records", len(transformed_records))
+    logger.info("=" * 60)
     
     return transformed_records
 
@@ -288,11 +317,13 @@ def update_student_stats(stats_collection, phone_number: str, message_type: str,
         },
         upsert=True
     )
-    print(f"Updated stats for {phone_number}: {update_field} = {timestamp}")
+    logger.debug("Updated stats for %s: %s = %s", phone_number, update_field, timestamp)
 
 
 # Example usage for testing
 if __name__ == '__main__':
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(message)s")
+    
     # Simulated extract data (this would come from your extract phase)
     sample_messages = [
         {
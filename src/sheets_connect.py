@@ -1,4 +1,6 @@
 import os
+import threading
+from functools import lru_cache
 from dotenv import load_dotenv
 import gspread
 from google.oauth2.service_account import Credentials
@@ -9,19 +11,74 @@ load_dotenv()
 # Google Sheets configuration
 credentials_file = os.getenv("CREDENTIALS_FILE")
 
+# Authorized client shared by every sheet (students and sales ETL run in parallel threads)
+_client = None
+_client_lock = threading.Lock()
+
+# get_all_values() snapshots keyed by (sheet_id, worksheet_name), shared by all readers in a run.
+# run_etl() clears them at the start of every run via clear_sheet_values().
+_values_cache = {}
+
 
 def init_google_sheets():
-    """Initialize Google Sheets connection"""
+    """
+    Initialize Google Sheets connection.
+    The authorized client is created once and reused; a failed attempt is retried on the next call.
+    """
+    global _client
+    
+    if _client is not None:
+        return _client
+    
     scopes = ['https://www.googleapis.com/auth/spreadsheets']
     
-    try:            
-        creds = Credentials.from_service_account_file(credentials_file, scopes=scopes)
-        client = gspread.authorize(creds)
-        print(f"Successfully connected to Google Sheets")
-        return client
+    try:
+        with _client_lock:
+            if _client is None:
+                creds = Credentials.from_service_account_file(credentials_file, scopes=scopes)
+                _client = gspread.authorize(creds)
+                print(f"Successfully connected to Google Sheets")
+        return _client
         
     except Exception as e:
         print(f"Error initializing Google Sheets: {e}")
         import traceback
         traceback.print_exc()
-        return None
\ No newline at end of file
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_worksheet(sheet_id, worksheet_name):
+    """
+    Open a worksheet once per process and reuse the handle on later calls.
+    Saves the auth + open_by_key + worksheet metadata round-trips for every
+    ETL stage that touches the same sheet. Failures are not cached.
+    """
+    client = init_google_sheets()
+    if not client:
+        raise ConnectionError("Failed to initialize Google Sheets client")
+    
+    spreadsheet = client.open_by_key(sheet_id)
+    return spreadsheet.worksheet(worksheet_name)
+
+
+def get_sheet_values(sheet_id, worksheet_name):
+    """
+    Return all values of a worksheet, reading it from the API only once.
+    Every reader in the run shares the same snapshot - treat it as read-only.
+    Call invalidate_sheet_values() after writing to the worksheet.
+    """
+    key = (sheet_id, worksheet_name)
+    if key not in _values_cache:
+        _values_cache[key] = get_worksheet(sheet_id, worksheet_name).get_all_values()
+    return _values_cache[key]
+
+
+def invalidate_sheet_values(sheet_id, worksheet_name):
+    """Drop the cached snapshot so the next get_sheet_values() re-reads the sheet"""
+    _values_cache.pop((sheet_id, worksheet_name), None)
+
+
+def clear_sheet_values():
+    """Drop every cached snapshot - call at the start of each ETL run"""
+    _values_cache.clear()